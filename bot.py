@@ -8,18 +8,26 @@ Render-ready Telegram bot (pre-match scanner).
 - Правильный парсинг odds: response[0..]["bookmakers"][..]["bets"][..]["values"][..]
 """
 
-import os, sys, time, json, logging
+import os, sys, time, logging
+
+import orjson  # state I/O: в разы быстрее stdlib json на наших словарях
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from threading import Thread
+from threading import Lock, Thread
 
 import pytz, requests, telebot
-from flask import Flask
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, request
+from waitress import serve
 
 # ====== ТВОИ ДАННЫЕ (для теста оставляю захардкожено; позже лучше перенести в ENV) ======
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "7980925106:AAG-kjxNUWjRGN0YzyUEaS_Wyd2rfWmQ6Nc")
 TELEGRAM_CHAT_ID   = int(os.getenv("TELEGRAM_CHAT_ID", "1244865850"))
 API_FOOTBALL_KEY   = os.getenv("API_FOOTBALL_KEY", "a5643739fb001333ba7b99b5bb67508e")
 TZ                 = os.getenv("TZ", "Europe/Warsaw")
+TZINFO             = pytz.timezone(TZ)  # объект immutable — строим один раз на процесс
 
 # Порог фаворита и коридор для 1Т ТБ0.5
 FAVORITE_MAX_ODDS = float(os.getenv("FAVORITE_MAX_ODDS", "1.80"))
@@ -29,33 +37,123 @@ FH_O05_MAX_ODDS   = float(os.getenv("FH_O05_MAX_ODDS", "1.85"))
 # Сразу запустить скан после старта
 RUN_ON_START = os.getenv("RUN_ON_START", "1") == "1"
 
+# Опционально: ограничить скан списком лиг ("39,140,135,...").
+# Пусто = все лиги, как раньше. Главная экономия — не платить odds-запросом
+# за сотни матчей лиг, которые не интересны.
+LEAGUE_IDS = frozenset(
+    int(x) for x in os.getenv("LEAGUES", "").replace(";", ",").split(",")
+    if x.strip().isdigit())
+
+# Чёрный список стран ("Friendlies,World,...") — дешёвый Python-фильтр
+# по полю, которое уже есть в ответе, до любых odds-запросов
+COUNTRY_BLACKLIST = frozenset(
+    x.strip() for x in os.getenv("COUNTRY_BLACKLIST", "").split(",") if x.strip())
+
 # ====== Логи/состояние ======
 LOG_FILE, STATE_FILE = "bot.log", "signals.json"
+SIGNALS_FILE = "signals.jsonl"  # append-only журнал сигналов, по строке на сигнал
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 log = logging.getLogger("scanner")
 
+# Webhook вместо long-polling, если известен внешний URL (Render его даёт сам):
+# нет вечного getUpdates-коннекта, команды приходят мгновенно через Flask
+PUBLIC_URL = os.getenv("PUBLIC_URL") or os.getenv("RENDER_EXTERNAL_URL", "")
+
 # ====== HTTP для Render ======
 app = Flask(__name__)
 @app.get("/")
 def healthcheck(): return "ok"
+
+@app.post("/tg")
+def tg_webhook():
+    try:
+        upd = telebot.types.Update.de_json(request.get_json(force=True))
+        bot.process_new_updates([upd])
+    except Exception as e:
+        log.error("webhook error: %s", e)
+    return "ok"
 def run_http():
     port = int(os.getenv("PORT", "10000"))
-    app.run(host="0.0.0.0", port=port)
+    # waitress вместо dev-сервера Werkzeug: меньше накладных на запрос,
+    # Render дёргает "/" каждые несколько секунд
+    serve(app, host="0.0.0.0", port=port, threads=2, connection_limit=16)
 
 # ====== Telegram ======
 if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID or not API_FOOTBALL_KEY:
     sys.exit("❌ Нужны TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, API_FOOTBALL_KEY")
 
 bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN, parse_mode="Markdown")
-def send(txt: str):
+
+class _Bucket:
+    """ Потокобезопасный token-bucket: take() досыпает до свободного токена. """
+    def __init__(self, rate, burst):
+        self.rate, self.capacity = rate, burst
+        self.tokens, self.last = burst, time.time()
+        self._lock = Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        if wait > 0: time.sleep(wait)
+
+# Telegram режет 30 msg/s — держимся на 25 с запасом, без 429 и ретраев
+SEND_BUCKET = _Bucket(25.0, 25.0)
+
+# Отправка в фоне: зависший Telegram (бывает 30+ сек) не должен
+# стопорить планировщик и сдвигать окна 08:00/23:30.
+# Один воркер: части длинного отчёта идут строго в порядке постановки
+SEND_POOL = ThreadPoolExecutor(max_workers=1)
+
+def _send_impl(txt: str):
+    SEND_BUCKET.take()
     try: bot.send_message(TELEGRAM_CHAT_ID, txt)
-    except Exception as e: log.error(f"Telegram send error: {e}")
+    except Exception as e: log.error("Telegram send error: %s", e)
+
+def send(txt: str):
+    SEND_POOL.submit(_send_impl, txt)
+
+# Горячий путь: POST в Bot API напрямую через requests с keep-alive,
+# минуя диспетчеризацию telebot. Для команд-ответов остаётся send().
+TG_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+TG = requests.Session()
+TG.mount("https://", HTTPAdapter(pool_maxsize=4))
+
+def send_fast(txt: str):
+    SEND_BUCKET.take()
+    try:
+        r = TG.post(TG_URL, json={"chat_id": TELEGRAM_CHAT_ID, "text": txt,
+                                  "parse_mode": "Markdown"}, timeout=10)
+        if r.status_code != 200:
+            log.warning("Telegram sendMessage HTTP %s %s", r.status_code, r.text[:200])
+    except Exception as e:
+        log.error("Telegram send_fast error: %s", e)
+
+def send_batched(texts, limit=3800):
+    """ Склеиваем несколько сигналов в одно сообщение (лимит Telegram 4096),
+        чтобы не упираться в 30 msg/s при большом числе сигналов за скан. """
+    buf = list(texts)
+    while buf:
+        chunk, size = [], 0
+        while buf and (not chunk or size + len(buf[0]) < limit):
+            chunk.append(buf.pop(0))
+            size += len(chunk[-1]) + 2
+        send_fast("\n\n".join(chunk))
 
 # ====== API-Football ======
 API = requests.Session()
 API.headers.update({"x-apisports-key": API_FOOTBALL_KEY})
+# keep-alive пул под параллельный скан + ретраи с backoff (в т.ч. на 429)
+API.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5,
+                      status_forcelist=[429, 500, 502, 503, 504])))
 DEFAULT_TIMEOUT = 25
 BASE = "https://v3.football.api-sports.io"
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "8"))
 
 def api_get(endpoint, params):
     url = f"{BASE}/{endpoint}"
@@ -64,109 +162,230 @@ def api_get(endpoint, params):
         if r.status_code != 200:
             log.warning("HTTP %s %s %s", r.status_code, url, r.text[:200])
         r.raise_for_status()
-        return r.json().get("response", []) or []
+        # orjson.loads(r.content) заметно быстрее r.json() на крупных ответах odds
+        return orjson.loads(r.content).get("response", []) or []
     except Exception as e:
-        log.error(f"api_get {endpoint} error: {e}")
+        log.error("api_get %s error: %s", endpoint, e)
         return []
 
 # ====== Память на день ======
 signals_today, signaled_ids = [], set()
 
-def now_local(): return datetime.now(pytz.timezone(TZ))
+# Результаты последнего скана — чтобы /debug сразу после /scan не дублировал API-вызовы
+LAST_SCAN = {"ts": 0.0, "total": 0, "with_1x2": 0, "with_fh": 0}
+LAST_SCAN_TTL = 600  # сек
+
+DAY_FMT = "%Y-%m-%d"  # один шаблон на все ключи дня
+
+def now_local(): return datetime.now(TZINFO)
+def today_key(): return now_local().strftime(DAY_FMT)
 def fmt_team(t): return (t.get("name") or "").strip()
 
 def load_state():
     global signals_today, signaled_ids
-    if not os.path.exists(STATE_FILE): return
+    day = today_key()
     try:
-        data = json.load(open(STATE_FILE, "r", encoding="utf-8"))
-        if data.get("day") == now_local().strftime("%Y-%m-%d"):
-            signals_today = data.get("signals", [])
-            signaled_ids = set(data.get("signaled", []))
+        if os.path.exists(STATE_FILE):
+            data = orjson.loads(open(STATE_FILE, "rb").read())
+            if data.get("day") == day:
+                if "deltas" in data:
+                    ids, cur = set(), data.get("base", 0)
+                    for d in data["deltas"]:
+                        cur += d; ids.add(cur)
+                    signaled_ids = ids
+                else:  # старый формат: плоский список
+                    signaled_ids = set(data.get("signaled", []))
+                signals_today = data.get("signals", [])  # старый формат хранил сигналы тут же
+        if os.path.exists(SIGNALS_FILE):
+            stale = 0
+            for line in open(SIGNALS_FILE, "rb"):
+                try: rec = orjson.loads(line)
+                except Exception: stale += 1; continue
+                if rec.get("day") == day:
+                    signals_today.append(rec)
+                    signaled_ids.add(rec.get("fixture_id"))
+                else:
+                    stale += 1
+            if stale:
+                _compact_signals(day)
     except Exception as e:
-        log.error(f"load_state error: {e}")
+        log.error("load_state error: %s", e)
+
+def _compact_signals(day):
+    """ Журнал append-only растёт бесконечно — при старте выкидываем чужие дни. """
+    try:
+        tmp = SIGNALS_FILE + ".tmp"
+        with open(tmp, "wb") as f:
+            for rec in signals_today:
+                f.write(orjson.dumps(rec) + b"\n")
+        os.replace(tmp, SIGNALS_FILE)
+        log.info("compacted %s: kept %d records for %s", SIGNALS_FILE, len(signals_today), day)
+    except Exception as e:
+        log.error("compact_signals error: %s", e)
+
+def append_signal(rec):
+    """ Одна строка в журнал вместо полной перезаписи состояния (O(1) на сигнал). """
+    try:
+        with open(SIGNALS_FILE, "ab") as f:
+            f.write(orjson.dumps(rec) + b"\n")
+    except Exception as e:
+        log.error("append_signal error: %s", e)
 
 def save_state():
+    """ Метаданные дня (антиповтор по id); сами сигналы — в append-only JSONL. """
     try:
-        json.dump({
-            "day": now_local().strftime("%Y-%m-%d"),
-            "signals": signals_today,
-            "signaled": list(signaled_ids)
-        }, open(STATE_FILE, "w", encoding="utf-8"), ensure_ascii=False)
+        # id матчей соседние по номерам — дельты от base в разы короче плоского списка
+        sorted_ids = sorted(signaled_ids)
+        base = sorted_ids[0] if sorted_ids else 0
+        deltas = [b - a for a, b in zip([base] + sorted_ids, sorted_ids)]
+        # пишем во временный файл и атомарно подменяем: SIGTERM посреди записи
+        # не оставит обрезанный JSON (и не потеряет антиповтор на рестарте)
+        tmp = STATE_FILE + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({
+                "day": today_key(),
+                "base": base,
+                "deltas": deltas
+            }))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, STATE_FILE)
     except Exception as e:
-        log.error(f"save_state error: {e}")
+        log.error("save_state error: %s", e)
 
 # ====== Парсинг коэффициентов (исправлено) ======
-def choose_favorite_from_1x2(bet):
-    """ bet['values'] -> [{'value':'Home','odd':'1.45'},{'value':'Draw',...},{'value':'Away','odd':'6.50'}] """
-    if not bet or "values" not in bet: return None, None
+@dataclass(slots=True)
+class BetView:
+    """ Плоский вид одного bet: имя уже в lower, values без None. """
+    name_l: str
+    values: list
+
+def bet_views(bm):
+    return [BetView((b.get("name") or "").lower(), b.get("values") or [])
+            for b in bm.get("bets") or []]
+
+# метки исходов: frozenset вместо кортежа — O(1) на каждую value каждого bet
+_HOME_LABELS = frozenset(("home", "1"))
+_AWAY_LABELS = frozenset(("away", "2"))
+
+def choose_favorite_from_1x2(bet: BetView):
+    """ values -> [{'value':'Home','odd':'1.45'},{'value':'Draw',...},{'value':'Away','odd':'6.50'}] """
+    if bet is None: return None, None
     home_odd = away_odd = None
-    for v in bet["values"]:
+    for v in bet.values:
         label = (v.get("value") or "").lower()
         try: odd = float(v.get("odd"))
         except: continue
-        if label in ("home","1"): home_odd = odd
-        elif label in ("away","2"): away_odd = odd
+        if label in _HOME_LABELS: home_odd = odd
+        elif label in _AWAY_LABELS: away_odd = odd
     if home_odd is None and away_odd is None: return None, None
     if home_odd is not None and (away_odd is None or home_odd <= away_odd): return "Home", home_odd
     if away_odd is not None: return "Away", away_odd
     return None, None
 
-def get_fh_over05_odds_from_bet(bet):
+# точные написания, которые реально отдаёт API — без .lower()/.replace() на value
+_FH_O05_EXACT = frozenset(("Over 0.5", "over 0.5"))
+_1X2_EXACT = frozenset(("match winner", "1x2", "match winner 1x2"))
+
+def get_fh_over05_odds_from_bet(bet: BetView):
     """ ищем Over 0.5 в 1st Half внутри одного bet """
-    for v in bet.get("values", []):
-        label = (v.get("value") or v.get("name") or "").lower().replace(" ", "")
+    for v in bet.values:
+        raw = v.get("value") or v.get("name") or ""
+        if raw in _FH_O05_EXACT:  # быстрый путь: ровно одно сравнение по хэшу
+            try: return float(v.get("odd") or v.get("price"))
+            except: return None
+        label = raw.lower().replace(" ", "")
         if "over" in label and ("0.5" in label or "0,5" in label):
             try: return float(v.get("odd") or v.get("price"))
             except: return None
     return None
 
-def odds_for_fixture(fixture_id: int):
+def parse_odds_response(data):
     """
+    Разбор ответа /odds (общий для sync и async сканов).
     Возвращаем:
       fav_side ('Home'/'Away') или None,
       fav_odds,
       fh_over05_odds (или None)
     Структура ответа: response[*]['bookmakers'][*]['bets'][*]['values'][*]
     """
-    data = api_get("odds", {"fixture": fixture_id})
-    if not data: return None, None, None
-
     fav_side, fav_odds, fh_o05 = None, None, None
 
     for root in data:
         for bm in root.get("bookmakers", []) or []:
-            bets = bm.get("bets") or []
+            bets = bet_views(bm)  # .lower() один раз на bet, дальше только атрибуты
             # 1x2 / Match Winner
             bet_1x2 = None
             for b in bets:
-                name = (b.get("name") or "").lower()
-                if ("match" in name and "winner" in name) or ("1x2" in name):
+                name = b.name_l
+                if name in _1X2_EXACT or ("match" in name and "winner" in name) or ("1x2" in name):
                     bet_1x2 = b; break
             fs, fo = choose_favorite_from_1x2(bet_1x2)
             if fs and fo and (fav_odds is None or fo < fav_odds):
                 fav_side, fav_odds = fs, fo
-            # 1st half Over/Under
+            # 1st half Over/Under — фаззи-условие цепляет и рынки без Over 0.5
+            # (командные тоталы и т.п.), поэтому выходим только найдя цену
             for b in bets:
-                name = (b.get("name") or "").lower()
-                if (("over" in name and "under" in name) or "total" in name or "goals" in name) and ("1st" in name and "half" in name):
+                name = b.name_l
+                if "half" not in name:  # дешёвый отсев до комбинированной проверки
+                    continue
+                if (("over" in name and "under" in name) or "total" in name or "goals" in name) and "1st" in name:
                     val = get_fh_over05_odds_from_bet(b)
-                    if val is not None and (fh_o05 is None or val < fh_o05):
-                        fh_o05 = val
+                    if val is not None:
+                        if fh_o05 is None or val < fh_o05:
+                            fh_o05 = val
+                        break
 
     return fav_side, fav_odds, fh_o05
 
+# Кэш odds на день: повторный /scan или /debug не перекачивает те же котировки.
+# TTL короткий — линии двигаются.
+ODDS_CACHE = {}           # fid -> (ts, ttl, (fav_side, fav_odds, fh_o05))
+ODDS_CACHE_TTL = 900      # сек
+ODDS_EMPTY_TTL = 120      # пустой ответ (нет рынков/сбой) — короткий негативный кэш
+_odds_cache_lock = Lock()
+# Темп /odds из пула потоков: Retry на 429 — восстановление, не пейсинг;
+# без него залп из SCAN_WORKERS запросов ловит 429, жжёт ретраи и
+# негативно кэширует "нет рынков". ~10 rps, как token-bucket в scan_async
+ODDS_BUCKET = _Bucket(10.0, 10.0)
+
+def odds_for_fixture(fixture_id: int):
+    """ fav_side/fav_odds/fh_o05 для одного матча (sync-путь), с TTL-кэшем. """
+    now = time.time()
+    with _odds_cache_lock:
+        hit = ODDS_CACHE.get(fixture_id)
+        if hit and now - hit[0] < hit[1]:
+            return hit[2]
+    ODDS_BUCKET.take()
+    data = api_get("odds", {"fixture": fixture_id})
+    parsed = parse_odds_response(data) if data else (None, None, None)
+    with _odds_cache_lock:
+        if len(ODDS_CACHE) > 4096:
+            ODDS_CACHE.clear()
+        # без котировок тоже кэшируем, но ненадолго: повторный /scan не
+        # молотит odds-запросами матчи, у которых рынков всё равно нет
+        ODDS_CACHE[fixture_id] = (now, ODDS_CACHE_TTL if data else ODDS_EMPTY_TTL, parsed)
+    return parsed
+
 # ====== Матчи на сегодня ======
+FIXTURES_CACHE = {"day": None, "ts": 0.0, "data": []}
+FIXTURES_CACHE_TTL = 600  # сек: ручной /scan сразу после автоскана не перекачивает день
+
 def fixtures_today():
-    """ Все NS/TBD/PST на сегодня, без фильтра лиг. """
-    d = now_local().strftime("%Y-%m-%d")
-    arr = api_get("fixtures", {"date": d, "timezone": TZ})
-    out = []
-    for m in arr:
-        st = ((m.get("fixture") or {}).get("status") or {}).get("short")
-        if st in ("NS","TBD","PST"):
-            out.append(m)
-    return out
+    """ Все NS/TBD/PST на сегодня, без фильтра лиг.
+        Фильтр по статусу уходит на сервер — ответ меньше, парсинг дешевле. """
+    d = today_key()
+    c = FIXTURES_CACHE
+    if c["day"] == d and time.time() - c["ts"] < FIXTURES_CACHE_TTL and c["data"]:
+        return c["data"]
+    data = api_get("fixtures", {"date": d, "timezone": TZ, "status": "NS-TBD-PST"})
+    if LEAGUE_IDS:
+        data = [m for m in data if ((m.get("league") or {}).get("id")) in LEAGUE_IDS]
+    if COUNTRY_BLACKLIST:
+        data = [m for m in data if ((m.get("league") or {}).get("country")) not in COUNTRY_BLACKLIST]
+    if data:
+        FIXTURES_CACHE.update(day=d, ts=time.time(), data=data)
+    return data
 
 # ====== Логика отбора ======
 def passes_strategy(fav_side, fav_odds, fh_o05_odds):
@@ -179,7 +398,7 @@ def passes_strategy(fav_side, fav_odds, fh_o05_odds):
 
 def build_signal_text(fix, fav_side, fav_odds, fh_o05_odds):
     f, l, t = fix["fixture"], fix["league"], fix["teams"]
-    dt = datetime.fromtimestamp(f["timestamp"], pytz.timezone(TZ)).strftime("%H:%M")
+    dt = datetime.fromtimestamp(f["timestamp"], TZINFO).strftime("%H:%M")
     home, away = fmt_team(t["home"]), fmt_team(t["away"])
     league_line = f"🏆 {l['country']} — {l['name']} (сезон {l['season']})"
     fav_line = f"⭐ Фаворит: {'Дом' if fav_side=='Home' else 'Гости'} @ {fav_odds:.2f}"
@@ -192,23 +411,46 @@ def build_signal_text(fix, fav_side, fav_odds, fh_o05_odds):
             "─────────────")
 
 # ====== Скан/отчёт/диагностика ======
+_scan_lock = Lock()
+
 def run_scan():
+    # стартовый скан, 08:00 и ручной /scan могут совпасть: оба потока снимут
+    # снимок signaled_ids до вставок и задублируют сигналы, а
+    # signals_today/LAST_SCAN будут мутироваться без защиты
+    if not _scan_lock.acquire(blocking=False):
+        send("⏳ Скан уже идёт — повторный запуск пропущен.")
+        return
+    try:
+        _run_scan_locked()
+    finally:
+        _scan_lock.release()
+
+def _run_scan_locked():
     fixtures = fixtures_today()
     checked = with_1x2 = with_fh = 0
     made = 0
+    pending = []  # тексты сигналов, шлём пачкой после цикла
 
+    # RTT-bound: качаем odds пулом потоков поверх общего keep-alive Session,
+    # вместо последовательного цикла с time.sleep
+    by_id = {}
     for m in fixtures:
         fid = (m.get("fixture") or {}).get("id")
-        if not fid or fid in signaled_ids: continue
+        if fid and fid not in signaled_ids:
+            by_id[fid] = m
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        odds = dict(zip(by_id, pool.map(odds_for_fixture, by_id)))
 
-        fav_side, fav_odds, fh_o05 = odds_for_fixture(fid)
+    for fid, m in by_id.items():
+        fav_side, fav_odds, fh_o05 = odds[fid]
         checked += 1
         if fav_side and fav_odds: with_1x2 += 1
         if fh_o05 is not None: with_fh += 1
 
         if passes_strategy(fav_side, fav_odds, fh_o05):
-            send(build_signal_text(m, fav_side, fav_odds, fh_o05))
+            pending.append(build_signal_text(m, fav_side, fav_odds, fh_o05))
             rec = {
+                "day": today_key(),
                 "fixture_id": fid,
                 "home": fmt_team(m["teams"]["home"]),
                 "away": fmt_team(m["teams"]["away"]),
@@ -218,28 +460,41 @@ def run_scan():
                 "fav_odds": fav_odds,
                 "fh_o05": fh_o05,
                 "kickoff": m["fixture"]["timestamp"],
+                # чистая функция от kickoff — считаем один раз при записи,
+                # отчёт больше не вызывает fromtimestamp/strftime на строку
+                "kickoff_hm": datetime.fromtimestamp(m["fixture"]["timestamp"], TZINFO).strftime("%H:%M"),
             }
             signals_today.append(rec)
+            append_signal(rec)
             signaled_ids.add(fid)
             made += 1
 
-        time.sleep(0.1)  # щадим бесплатный тариф
-
+    LAST_SCAN.update(ts=time.time(), total=len(fixtures), with_1x2=with_1x2, with_fh=with_fh)
     save_state()
+    send_batched(pending)
     send(f"🔎 Скан завершён: матчей {len(fixtures)}, проверено {checked}, c 1X2: {with_1x2}, c 1Т О0.5: {with_fh}, сигналов: {made}.")
 
 def send_daily_report():
     lines = ["📊 *Отчёт за день (прематч)*",
-             f"Дата: {now_local().strftime('%Y-%m-%d')}",
+             f"Дата: {today_key()}",
              f"Сигналов отправлено: {len(signals_today)}"]
     if not signals_today:
         send("\n".join(lines)); return
     for i, s in enumerate(signals_today, 1):
-        tm = datetime.fromtimestamp(s["kickoff"], pytz.timezone(TZ)).strftime("%H:%M")
+        tm = s.get("kickoff_hm") or datetime.fromtimestamp(s["kickoff"], TZINFO).strftime("%H:%M")
         fav = "Дом" if s["fav_side"] == "Home" else "Гости"
         o05 = f"{s['fh_o05']:.2f}" if s["fh_o05"] else "нет"
         lines.append(f"{i:02d}. {s['home']} — {s['away']} [{tm}] | fav {fav} @{s['fav_odds']:.2f} | 1Т ТБ0.5: {o05}")
-    send("\n".join(lines))
+    # длинный день не влезает в 4096 — режем отчёт на сообщения по границам строк
+    chunk, size = [], 0
+    for ln in lines:
+        if chunk and size + len(ln) > 3800:
+            send("\n".join(chunk))
+            chunk, size = [], 0
+        chunk.append(ln)
+        size += len(ln) + 1
+    if chunk:
+        send("\n".join(chunk))
 
 # ====== Telegram команды ======
 @bot.message_handler(commands=["start","help"])
@@ -258,7 +513,13 @@ def on_status(m):
 
 @bot.message_handler(commands=["debug"])
 def on_debug(m):
-    d = now_local().strftime("%Y-%m-%d")
+    d = today_key()
+    if time.time() - LAST_SCAN["ts"] < LAST_SCAN_TTL:
+        # свежий скан уже всё посчитал — не жжём API повторно
+        send(f"🛠 Debug {d} (из кэша скана): матчей={LAST_SCAN['total']}, "
+             f"с 1X2={LAST_SCAN['with_1x2']}, с 1Т О0.5={LAST_SCAN['with_fh']}. "
+             "Если 1X2 мало — это ограничение покрытия odds на бесплатном тарифе.")
+        return
     fixtures = fixtures_today()
     total = len(fixtures)
     with1x2 = withfh = 0
@@ -269,6 +530,7 @@ def on_debug(m):
         if fs and fo: with1x2 += 1
         if fh is not None: withfh += 1
         time.sleep(0.05)
+    LAST_SCAN.update(ts=time.time(), total=total, with_1x2=with1x2, with_fh=withfh)
     send(f"🛠 Debug {d}: матчей={total}, с 1X2={with1x2}, с 1Т О0.5={withfh}. "
          "Если 1X2 мало — это ограничение покрытия odds на бесплатном тарифе.")
 
@@ -277,24 +539,52 @@ def on_scan(m):
     send("Запускаю сканирование ✅")
     try: run_scan()
     except Exception as e:
-        log.error(f"/scan error: {e}")
+        log.error("/scan error: %s", e)
         send("❌ Ошибка при сканировании, см. логи.")
 
 # ====== Планировщик ======
+SCAN_AT_MIN   = 8 * 60        # 08:00 как минута дня — сравниваем int, не кортежи
+REPORT_AT_MIN = 23 * 60 + 30  # 23:30
+
+def minute_of_day(dt): return dt.hour * 60 + dt.minute
+
 def timers_loop():
-    last_scan_key = last_report_key = None
-    tz = pytz.timezone(TZ)
+    """ Спим до ближайшего события (скан 08:00, отчёт 23:30) вместо
+        пробуждения каждые 30с. Сон ограничен 300с, чтобы переживать
+        перевод часов и не терять исключения надолго. """
+    tz = TZINFO
+    start = datetime.now(tz)
+    start_key = start.strftime(DAY_FMT)
+    # при старте посреди дня прошедшие события считаем отработанными
+    start_min = minute_of_day(start)
+    last_scan_key = start_key if start_min > SCAN_AT_MIN else None
+    last_report_key = start_key if start_min > REPORT_AT_MIN else None
+    scan_tries = 0
     while True:
         try:
-            now = datetime.now(tz); key = now.strftime("%Y-%m-%d")
-            if now.hour == 8 and now.minute == 0 and last_scan_key != key:
-                send("⏰ 08:00 — авто-скан.")
-                run_scan(); last_scan_key = key
-            if now.hour == 23 and now.minute == 30 and last_report_key != key:
+            now = datetime.now(tz); key = now.strftime(DAY_FMT)
+            scan_at = now.replace(hour=8, minute=0, second=0, microsecond=0)
+            report_at = now.replace(hour=23, minute=30, second=0, microsecond=0)
+            if now >= scan_at and last_scan_key != key:
+                # упавший run_scan повторяется через 30с (общий except), но не
+                # бесконечно: после трёх попыток сдаёмся до завтра, анонс — один
+                if scan_tries < 3:
+                    if scan_tries == 0:
+                        send("⏰ 08:00 — авто-скан.")
+                    scan_tries += 1
+                    run_scan()
+                last_scan_key = key
+                scan_tries = 0
+            if now >= report_at and last_report_key != key:
                 send_daily_report(); last_report_key = key
+            now = datetime.now(tz)
+            pending = [t for t, k in ((scan_at, last_scan_key), (report_at, last_report_key))
+                       if t > now and k != key]
+            wait = (min(pending) - now).total_seconds() if pending else 300
         except Exception as e:
-            log.error(f"timers error: {e}")
-        time.sleep(30)
+            log.error("timers error: %s", e)
+            wait = 30
+        time.sleep(max(1, min(wait, 300)))
 
 # ====== RUN ======
 if __name__ == "__main__":
@@ -303,13 +593,28 @@ if __name__ == "__main__":
     send("🚀 Бот запущен (прематч, фаворит → 1Т ТБ0.5).")
     send("ℹ️ Автоскан 08:00, отчёт 23:30. Для теста: /scan, диагностика: /debug")
     if RUN_ON_START:
+        def _startup_scan():
+            try:
+                send("↻ RUN_ON_START=1 — запускаю разовый скан.")
+                run_scan()
+            except Exception as e:
+                log.error("startup scan error: %s", e)
+        # скан может идти минуты — не держим им старт планировщика и поллинга
+        Thread(target=_startup_scan, daemon=True).start()
+    Thread(target=timers_loop, daemon=True).start()
+    if PUBLIC_URL:
         try:
-            send("↻ RUN_ON_START=1 — запускаю разовый скан.")
-            run_scan()
+            bot.remove_webhook()
+            bot.set_webhook(url=PUBLIC_URL.rstrip("/") + "/tg")
+            log.info("webhook mode: %s/tg", PUBLIC_URL.rstrip("/"))
+            while True:
+                time.sleep(3600)  # команды обслуживает Flask-роут /tg
         except Exception as e:
-            log.error(f"startup scan error: {e}")
-    Thread(target=timers_loop, daemon=True).start()
+            log.error("webhook setup error: %s", e)
     try:
+        # если прошлый запуск регистрировал webhook, getUpdates вернёт 409 —
+        # снимаем его перед переходом на поллинг
+        bot.remove_webhook()
         bot.infinity_polling(timeout=60, long_polling_timeout=60)
     except Exception as e:
-        log.error(f"polling error: {e}")
+        log.error("polling error: %s", e)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Асинхронный скан (aiohttp + asyncio.gather).
+Сотни независимых GET /odds перекрываются на одном потоке —
+вместо последовательного цикла с time.sleep в run_scan.
+Telegram-поллинг (telebot) остаётся в своём потоке, как и был.
+Запуск: python scan_async.py  (или asyncio.run(run_scan_async()) из кода).
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+import aiohttp
+import orjson
+
+import bot
+from bot import (
+    API_FOOTBALL_KEY, BASE, DEFAULT_TIMEOUT, TZINFO,
+    fixtures_today, parse_odds_response, passes_strategy,
+    build_signal_text, fmt_team, send, send_batched, save_state,
+    append_signal, today_key,
+)
+# signals_today/signaled_ids берём как атрибуты модуля (bot.signaled_ids):
+# load_state() перепривязывает эти глобалы, и снимок из from-import устареет
+
+log = logging.getLogger("scanner.async")
+
+MAX_CONCURRENCY = 16          # одновременных запросов к /odds
+REQUEST_INTERVAL = 0.1        # token-bucket: щадим бесплатный тариф
+
+async def api_get_async(sess, endpoint, params):
+    url = f"{BASE}/{endpoint}"
+    try:
+        async with sess.get(url, params=params) as r:
+            if r.status != 200:
+                log.warning("HTTP %s %s", r.status, url)
+            r.raise_for_status()
+            data = await r.json(loads=orjson.loads)
+            return data.get("response", []) or []
+    except Exception as e:
+        log.error("api_get_async %s error: %s", endpoint, e)
+        return []
+
+async def fetch_odds(sess, sema, bucket, fid):
+    async with sema:
+        await bucket.acquire()
+        data = await api_get_async(sess, "odds", {"fixture": fid})
+    return fid, parse_odds_response(data) if data else (None, None, None)
+
+class _TokenBucket:
+    """ Простейший token-bucket: не чаще одного запроса в interval сек. """
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+async def run_scan_async():
+    fixtures = await asyncio.to_thread(fixtures_today)
+    by_id = {}
+    for m in fixtures:
+        fid = (m.get("fixture") or {}).get("id")
+        if fid and fid not in bot.signaled_ids:
+            by_id[fid] = m
+
+    checked = with_1x2 = with_fh = made = 0
+    pending = []
+    sema = asyncio.Semaphore(MAX_CONCURRENCY)
+    bucket = _TokenBucket(REQUEST_INTERVAL)
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=600, keepalive_timeout=75)
+    async with aiohttp.ClientSession(
+            headers={"x-apisports-key": API_FOOTBALL_KEY},
+            connector=connector, timeout=timeout) as sess:
+        results = await asyncio.gather(
+            *[fetch_odds(sess, sema, bucket, fid) for fid in by_id])
+
+    for fid, (fav_side, fav_odds, fh_o05) in results:
+        m = by_id[fid]
+        checked += 1
+        if fav_side and fav_odds: with_1x2 += 1
+        if fh_o05 is not None: with_fh += 1
+
+        if passes_strategy(fav_side, fav_odds, fh_o05):
+            pending.append(build_signal_text(m, fav_side, fav_odds, fh_o05))
+            rec = {
+                "day": today_key(),
+                "fixture_id": fid,
+                "home": fmt_team(m["teams"]["home"]),
+                "away": fmt_team(m["teams"]["away"]),
+                "league": m["league"]["name"],
+                "country": m["league"]["country"],
+                "fav_side": fav_side,
+                "fav_odds": fav_odds,
+                "fh_o05": fh_o05,
+                "kickoff": m["fixture"]["timestamp"],
+                "kickoff_hm": datetime.fromtimestamp(
+                    m["fixture"]["timestamp"], TZINFO).strftime("%H:%M"),
+            }
+            bot.signals_today.append(rec)
+            append_signal(rec)
+            bot.signaled_ids.add(fid)
+            made += 1
+
+    save_state()
+    send_batched(pending)
+    send(f"🔎 Скан (async) завершён: матчей {len(fixtures)}, проверено {checked}, "
+         f"c 1X2: {with_1x2}, c 1Т О0.5: {with_fh}, сигналов: {made}.")
+
+if __name__ == "__main__":
+    # standalone-запуск обязан подхватить антиповтор дня, иначе повторные
+    # сигналы + save_state() затрёт signals.json состоянием одного прогона
+    bot.load_state()
+    asyncio.run(run_scan_async())